@@ -7,7 +7,10 @@
 import io
 import json
 import logging
+import multiprocessing
 import os
+import signal
+import sys
 from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
@@ -24,6 +27,7 @@ from tornado import httpserver
 from tornado import ioloop
 from tornado import web
 from tornado.curl_httpclient import curl_log
+from tornado.curl_httpclient import CurlAsyncHTTPClient
 from tornado.log import access_log
 from tornado.log import app_log
 from tornado.log import LogFormatter
@@ -89,6 +93,7 @@ class NBViewer(Application):
         {
             "base-url": "NBViewer.base_url",
             "binder-base-url": "NBViewer.binder_base_url",
+            "cache-expiry-error": "NBViewer.cache_expiry_error",
             "cache-expiry-max": "NBViewer.cache_expiry_max",
             "cache-expiry-min": "NBViewer.cache_expiry_min",
             "config-file": "NBViewer.config_file",
@@ -102,6 +107,7 @@ class NBViewer(Application):
             "localfiles": "NBViewer.localfiles",
             "log-level": "Application.log_level",
             "mathjax-url": "NBViewer.mathjax_url",
+            "max-clients": "NBViewer.max_clients",
             "mc-threads": "NBViewer.mc_threads",
             "port": "NBViewer.port",
             "processes": "NBViewer.processes",
@@ -221,6 +227,10 @@ class NBViewer(Application):
         help="URL base for binder notebook execution service.",
     ).tag(config=True)
 
+    cache_expiry_error = Int(
+        default_value=2 * 60, help="Cache expiry for error pages, e.g. 404 (seconds)."
+    ).tag(config=True)
+
     cache_expiry_max = Int(
         default_value=2 * 60 * 60, help="Maximum cache expiry (seconds)."
     ).tag(config=True)
@@ -233,7 +243,16 @@ class NBViewer(Application):
 
     @default("client")
     def _default_client(self):
-        client = HTTPClientClass(log=self.log)
+        # one pool of keep-alive connections for all providers,
+        # with fetch_kwargs (timeouts, proxy, certificates) applied to every request
+        client = HTTPClientClass(
+            log=self.log,
+            client=CurlAsyncHTTPClient(
+                force_instance=True,
+                max_clients=self.max_clients,
+                defaults=self.fetch_kwargs,
+            ),
+        )
         client.cache = self.cache
         return client
 
@@ -323,6 +342,11 @@ class NBViewer(Application):
                 max_cache_uris.add("/" + link["target"])
         return max_cache_uris
 
+    max_clients = Int(
+        default_value=100,
+        help="Maximum number of concurrent upstream requests. Connections are kept alive and reused.",
+    ).tag(config=True)
+
     mc_threads = Int(
         default_value=1, help="Number of threads to use for Async Memcache."
     ).tag(config=True)
@@ -340,9 +364,20 @@ class NBViewer(Application):
         return self.default_endpoint["port"]
 
     processes = Int(
-        default_value=0, help="Use processes instead of threads for rendering."
+        help="Number of processes to use for rendering, by default the available CPUs up to 4. Container CPU limits are not detected, so set this to match them. Set to 0 to render in threads instead.",
     ).tag(config=True)
 
+    @default("processes")
+    def _default_processes(self):
+        # the cpus we may run on, which in a container can be fewer than
+        # os.cpu_count(); each process holds its own copy of the exporters,
+        # so don't start more than a few by default
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+        return min(cpus, 4)
+
     provider_rewrites = List(
         trait=Unicode,
         default_value=default_rewrites,
@@ -410,9 +445,9 @@ class NBViewer(Application):
         help="Custom template path for the nbviewer app (not rendered notebooks).",
     ).tag(config=True)
 
-    threads = Int(default_value=1, help="Number of threads to use for rendering.").tag(
-        config=True
-    )
+    threads = Int(
+        default_value=1, help="Number of threads to use for rendering, if processes=0."
+    ).tag(config=True)
 
     # prefer the JupyterHub defined service prefix over the CLI
     @cached_property
@@ -557,7 +592,10 @@ class NBViewer(Application):
     @cached_property
     def pool(self):
         if self.processes:
-            pool = ProcessPoolExecutor(self.processes)
+            # spawn rather than fork, the server process has threads of its own
+            pool = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
         else:
             pool = ThreadPoolExecutor(self.threads)
         return pool
@@ -663,6 +701,7 @@ class NBViewer(Application):
             base_url=self._base_url,
             binder_base_url=self.binder_base_url,
             cache=self.cache,
+            cache_expiry_error=self.cache_expiry_error,
             cache_expiry_max=self.cache_expiry_max,
             cache_expiry_min=self.cache_expiry_min,
             client=self.client,
@@ -689,6 +728,7 @@ class NBViewer(Application):
             log_function=log_request,
             mathjax_url=self.mathjax_url,
             max_cache_uris=self.max_cache_uris,
+            no_cache=self.no_cache,
             pool=self.pool,
             provider_rewrites=self.provider_rewrites,
             providers=self.providers,
@@ -807,7 +847,16 @@ def main(argv=None):
     )
 
     http_server.listen(nbviewer.port, nbviewer.host)
-    ioloop.IOLoop.current().start()
+    loop = ioloop.IOLoop.current()
+    # stop cleanly on SIGTERM, so the render processes are stopped as well
+    loop.asyncio_loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    try:
+        loop.start()
+    finally:
+        if sys.version_info >= (3, 9):
+            nbviewer.pool.shutdown(cancel_futures=True)
+        else:
+            nbviewer.pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ import pickle
 import time
 
 from tornado.curl_httpclient import CurlAsyncHTTPClient
+from tornado.httpclient import HTTPError
 from tornado.httpclient import HTTPRequest
 
 from nbviewer.utils import time_block
@@ -48,6 +49,8 @@ class NBViewerAsyncHTTPClient(object):
     def __init__(self, log, client=None):
         self.log = log
         self.client = client or CurlAsyncHTTPClient()
+        # in-flight upstream requests, by url
+        self.pending = {}
 
     def fetch(self, url, params=None, **kwargs):
         request = HTTPRequest(url, **kwargs)
@@ -55,16 +58,33 @@ class NBViewerAsyncHTTPClient(object):
         if request.user_agent is None:
             request.user_agent = "Tornado-Async-Client"
 
-        # The future which will become the response upon awaiting.
-        response_future = asyncio.ensure_future(self.smart_fetch(request))
+        if request.method != "GET":
+            return asyncio.ensure_future(self.smart_fetch(request))
+
+        # concurrent requests for the same url share a single upstream fetch
+        response_future = self.pending.get(request.url)
+        if response_future is None:
+            # The future which will become the response upon awaiting.
+            response_future = asyncio.ensure_future(self.smart_fetch(request))
+            self.pending[request.url] = response_future
+            response_future.add_done_callback(
+                lambda f: self.pending.pop(request.url, None)
+            )
+        else:
+            self.log.debug(
+                "Sharing in-flight request for %s", request.url.split("?")[0]
+            )
 
-        return response_future
+        # each caller gets its own view of the shared fetch,
+        # so one of them being cancelled doesn't cancel it for the others
+        return asyncio.shield(response_future)
 
     async def smart_fetch(self, request):
         """
         Before fetching request, first look to see whether it's already in cache.
-        If so load the response from cache. Only otherwise attempt to fetch the request.
-        When response code isn't 304 or 400, cache response before loading, else just load.
+        If so, make the request conditional on the cached response's ETag / Last-Modified,
+        and load the response from cache if upstream replies 304 Not Modified.
+        When a fresh response is fetched, cache it before loading.
         """
         tic = time.time()
 
@@ -74,7 +94,9 @@ class NBViewerAsyncHTTPClient(object):
 
         # look for a cached response
         cached_response = None
-        cache_key = hashlib.sha256(request.url.encode("utf8")).hexdigest()
+        cache_key = hashlib.blake2b(
+            request.url.encode("utf8"), digest_size=16
+        ).hexdigest()
         cached_response = await self._get_cached_response(cache_key, name)
         toc = time.time()
         self.log.info("Upstream cache get %s %.2f ms", name, 1e3 * (toc - tic))
@@ -86,15 +108,34 @@ class NBViewerAsyncHTTPClient(object):
                 value = cached_response.headers.get(resp_key)
                 if value:
                     request.headers[req_key] = value
-            return cached_response
         else:
             self.log.info("Upstream cache miss %s", name)
 
+        try:
             response = await self.client.fetch(request)
-            dt = time.time() - tic
-            self.log.info("Fetched %s in %.2f ms", name, 1e3 * dt)
-            await self._cache_response(cache_key, name, response)
-            return response
+        except HTTPError as e:
+            if cached_response and (e.code == 304 or e.code >= 500):
+                if e.code == 304:
+                    self.log.info("Upstream %s not modified", name)
+                else:
+                    self.log.warning(
+                        "Upstream %s failed with %i, using cached response",
+                        name,
+                        e.code,
+                    )
+                if e.response is not None:
+                    # the rate limit is counted by this request,
+                    # not the one that was cached
+                    for key, value in e.response.headers.get_all():
+                        if key.lower().startswith("x-ratelimit-"):
+                            cached_response.headers[key] = value
+                return cached_response
+            raise
+
+        dt = time.time() - tic
+        self.log.info("Fetched %s in %.2f ms", name, 1e3 * dt)
+        await self._cache_response(cache_key, name, response)
+        return response
 
     async def _get_cached_response(self, cache_key, name):
         """Get the cached response, if any"""
@@ -112,6 +153,9 @@ class NBViewerAsyncHTTPClient(object):
         """Cache the response, if any cache headers we understand are present."""
         if not self.cache:
             return
+        if not any(key in response.headers for key in cache_headers):
+            # can't revalidate without a validator, so there's no point caching
+            return
         with time_block("Upstream cache set %s" % name, logger=self.log):
             # cache the response
             try:
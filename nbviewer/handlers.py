@@ -4,7 +4,11 @@
 #  Distributed under the terms of the BSD License.  The full license is in
 #  the file COPYING, distributed as part of this software.
 # -----------------------------------------------------------------------------
+import re
+
 from tornado import web
+from tornado.routing import PathMatches
+from tornado.routing import Rule
 
 from .providers import _load_handler_from_location
 from .providers import provider_handlers
@@ -104,6 +108,108 @@ def format_handlers(formats, urlspecs, **handler_settings):
     return urlspecs
 
 
+_regex_special = set("\\.^$*+?{}[]|()")
+_regex_quantifiers = set("*+?{")
+
+
+def _has_alternation(pattern):
+    """Whether a URL pattern has a `|` outside of any group"""
+    depth = 0
+    in_class = escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+    return False
+
+
+def _literal_prefix(pattern):
+    """The leading part of a URL pattern that matches only itself, or None
+
+    None if the pattern is an alternation, which has no common prefix.
+    """
+    if _has_alternation(pattern):
+        return None
+    for idx, char in enumerate(pattern):
+        if char in _regex_special:
+            if char in _regex_quantifiers:
+                # the preceding character is optional
+                idx -= 1
+            return pattern[:idx]
+    return pattern
+
+
+def _group_key(pattern, offset):
+    """The literal path prefix used to group a pattern, or None
+
+    This is the first path segment after offset (with its trailing slash),
+    or as much of it as is literal.
+    """
+    literal = _literal_prefix(pattern)
+    if literal is None:
+        return None
+    end = literal.find("/", offset + 1)
+    key = literal if end < 0 else literal[: end + 1]
+    if len(key) <= offset + 1:
+        return None
+    return key
+
+
+def group_handlers(handlers, offset=0):
+    """Group URL specs that share a literal path prefix into nested routers
+
+    Tornado tries each URL pattern in turn, so with the handlers of every
+    provider repeated for every format, a request may be matched against
+    dozens of regexes. Grouped, a request is only matched against the
+    patterns under its own prefix.
+
+    The first matching handler still wins: only specs whose prefixes can't
+    match the same path are reordered, and specs without a literal prefix
+    (e.g. `.*`) keep their place relative to all others.
+    """
+    grouped = []
+    groups = {}
+
+    def flush():
+        for key, specs in groups.items():
+            if len(specs) == 1:
+                grouped.extend(specs)
+            else:
+                grouped.append(
+                    Rule(
+                        PathMatches(re.escape(key) + ".*"),
+                        group_handlers(specs, offset=len(key)),
+                    )
+                )
+        groups.clear()
+
+    for spec in handlers:
+        key = _group_key(spec[0], offset)
+        if key is None or any(
+            other != key and (other.startswith(key) or key.startswith(other))
+            for other in groups
+        ):
+            # may match the same paths as a previous spec, keep the order
+            flush()
+        if key is None:
+            grouped.append(spec)
+        else:
+            groups.setdefault(key, []).append(spec)
+    flush()
+    return grouped
+
+
 def init_handlers(formats, providers, base_url, localfiles, **handler_kwargs):
     """
     `handler_kwargs` is a dict of dicts: first dict is `handler_names`, which
@@ -156,4 +262,4 @@ def init_handlers(formats, providers, base_url, localfiles, **handler_kwargs):
         new_handlers.append(new_handler)
     new_handlers.append((r".*", custom404_handler, {}))
 
-    return new_handlers
+    return group_handlers(new_handlers)
@@ -5,9 +5,11 @@
 #  the file COPYING, distributed as part of this software.
 # -----------------------------------------------------------------------------
 import asyncio
+import gzip
 import hashlib
 import pickle
 import time
+from collections import namedtuple
 from contextlib import contextmanager
 from datetime import datetime
 from functools import wraps
@@ -36,17 +38,36 @@ from ..utils import parse_header_links
 from ..utils import time_block
 from ..utils import url_path_join
 
-try:
-    import pycurl
-    from tornado.curl_httpclient import CurlError
-except ModuleNotFoundError:
-    pycurl = None  # type: ignore
+format_prefix = "/format/"
 
-    class CurlError(Exception):  # type: ignore
-        pass
+# how many distinct rendered error pages to keep
+error_pages_limit = 256
 
 
-format_prefix = "/format/"
+def body_etag(*chunks):
+    """Compute an ETag value for a response body"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return '"%s"' % hasher.hexdigest()
+
+
+class ListingEntry(namedtuple("ListingEntry", ["name", "url", "icon"], defaults=[""])):
+    """An entry of a repository, tree or gist listing
+
+    A tuple rather than a dict, as large listings build thousands of them.
+    The icon class is also available as `entry.class` / `entry["class"]`
+    in templates, as it was when entries were dicts.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key == "class":
+            return self.icon
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
 
 
 class BaseHandler(web.RequestHandler):
@@ -85,6 +106,10 @@ class BaseHandler(web.RequestHandler):
 
         return super().redirect(eurl, *args, **kwargs)
 
+    def compute_etag(self):
+        """blake2b of the response body, cheaper than tornado's default sha1"""
+        return body_etag(*self._write_buffer)
+
     def set_default_headers(self):
         self.add_header("Content-Security-Policy", self.content_security_policy)
 
@@ -131,6 +156,13 @@ class BaseHandler(web.RequestHandler):
 
     # Properties
 
+    @property
+    def accepts_gzip(self):
+        """Whether the response may be sent gzip-encoded"""
+        return self.settings.get(
+            "compress_response", self.settings.get("gzip")
+        ) and "gzip" in self.request.headers.get("Accept-Encoding", "")
+
     @property
     def base_url(self):
         return self.settings["base_url"]
@@ -143,6 +175,10 @@ class BaseHandler(web.RequestHandler):
     def cache(self):
         return self.settings["cache"]
 
+    @property
+    def cache_expiry_error(self):
+        return self.settings.setdefault("cache_expiry_error", 120)
+
     @property
     def cache_expiry_max(self):
         return self.settings.setdefault("cache_expiry_max", 120)
@@ -167,6 +203,10 @@ class BaseHandler(web.RequestHandler):
     def default_format(self):
         return self.settings["default_format"]
 
+    @property
+    def error_pages(self):
+        return self.settings.setdefault("error_pages", {})
+
     @property
     def formats(self):
         return self.settings["formats"]
@@ -219,6 +259,10 @@ class BaseHandler(web.RequestHandler):
     def max_cache_uris(self):
         return self.settings.setdefault("max_cache_uris", set())
 
+    @property
+    def no_cache(self):
+        return self.settings.get("no_cache", False)
+
     @property
     def pending(self):
         return self.settings.setdefault("pending", {})
@@ -255,6 +299,10 @@ class BaseHandler(web.RequestHandler):
             self._statsd = EmptyClass()
             return self._statsd
 
+    @property
+    def templates(self):
+        return self.settings.setdefault("templates", {})
+
     # ---------------------------------------------------------------
     # template rendering
     # ---------------------------------------------------------------
@@ -265,8 +313,17 @@ class BaseHandler(web.RequestHandler):
         return url_path_join(self.base_url, url, *args)
 
     def get_template(self, name):
-        """Return the jinja template object for a given name"""
-        return self.settings["jinja2_env"].get_template(name)
+        """Return the jinja template object for a given name
+
+        Compiled templates are kept for the life of the application,
+        skipping the jinja2 cache lock and up-to-date check on every render.
+        """
+        template = self.templates.get(name)
+        if template is None:
+            template = self.settings["jinja2_env"].get_template(name)
+            if not self.no_cache:
+                self.templates[name] = template
+        return template
 
     def render_template(self, name, **namespace):
         namespace.update(self.template_namespace)
@@ -347,22 +404,16 @@ class BaseHandler(web.RequestHandler):
             msg = str_exc
 
         # Now get the error code
-        if exc.code == 599:
-            if isinstance(exc, CurlError):
-                en = getattr(exc, "errno", -1)
-                # can't connect to server should be 404
-                # possibly more here
-                if en in (pycurl.E_COULDNT_CONNECT, pycurl.E_COULDNT_RESOLVE_HOST):
-                    code = 404
-            # otherwise, raise 400 with informative message:
-            code = 400
-        elif exc.code >= 500:
-            # 5XX, server error, but not this server
+        if exc.code >= 500:
+            # 5XX, server error, but not this server, or 599, no response
+            # at all (e.g. can't resolve or connect to the host).
+            # Likely transient, so not a 404 that would be cached
             code = 502
         else:
             # client-side error, blame our client
-            if exc.code == 404:
-                code = 404
+            if exc.code in (403, 404):
+                # forbidden or not found upstream, the same for us
+                code = exc.code
                 msg = "Remote %s" % msg
             else:
                 code = 400
@@ -396,7 +447,8 @@ class BaseHandler(web.RequestHandler):
         except httpclient.HTTPError as e:
             self.reraise_client_error(e)
         except OSError as e:
-            raise web.HTTPError(404, str(e))
+            # couldn't reach upstream
+            raise web.HTTPError(502, str(e))
 
     @property
     def fetch_kwargs(self):
@@ -416,6 +468,15 @@ class BaseHandler(web.RequestHandler):
 
     def write_error(self, status_code: int, **kwargs):
         """render custom error pages"""
+        html = self.render_error_page(status_code, **kwargs)
+        self.set_header("Content-Type", "text/html")
+        self.write(html)
+
+    def render_error_page(self, status_code: int, **kwargs):
+        """render the error page for a status code, given write_error's kwargs
+
+        Returns the page as UTF-8 bytes.
+        """
         exc_info = kwargs.get("exc_info")
         message: str = ""
         status_message = responses.get(status_code, "Unknown")
@@ -433,6 +494,15 @@ class BaseHandler(web.RequestHandler):
             if reason:
                 status_message = reason
 
+        # error pages only depend on these, so most of them
+        # (e.g. every 404 for a missing page) are rendered only once.
+        # The handler class is part of the key, as subclasses may
+        # override the render_*_template hooks.
+        key = (type(self), status_code, status_message, message)
+        html = self.error_pages.get(key)
+        if html is not None:
+            return html
+
         # build template namespace
         namespace = dict(
             status_code=status_code,
@@ -446,8 +516,14 @@ class BaseHandler(web.RequestHandler):
             html = self.render_status_code_template(status_code, **namespace)
         except Exception:
             html = self.render_error_template(**namespace)
-        self.set_header("Content-Type", "text/html")
-        self.write(html)
+        html = utf8(html)
+
+        if not self.no_cache:
+            if len(self.error_pages) >= error_pages_limit:
+                # drop the oldest page
+                self.error_pages.pop(next(iter(self.error_pages)))
+            self.error_pages[key] = html
+        return html
 
     # ---------------------------------------------------------------
     # response caching
@@ -457,7 +533,7 @@ class BaseHandler(web.RequestHandler):
     def cache_headers(self):
         # are there other headers to cache?
         h = {}
-        for key in ("Content-Type",):
+        for key in ("Content-Type", "Etag"):
             if key in self._headers:
                 h[key] = self._headers[key]
         return h
@@ -465,13 +541,16 @@ class BaseHandler(web.RequestHandler):
     _cache_key = None
     _cache_key_attr = "uri"
 
+    # status codes of errors that are cached for cache_expiry_error
+    cache_error_codes = (404,)
+
     @property
     def cache_key(self):
         """Use checksum for cache key because cache has size limit on keys"""
 
         if self._cache_key is None:
             to_hash = utf8(getattr(self.request, self._cache_key_attr))
-            self._cache_key = hashlib.sha1(to_hash).hexdigest()
+            self._cache_key = hashlib.blake2b(to_hash, digest_size=16).hexdigest()
         return self._cache_key
 
     def truncate(self, s, limit=256):
@@ -503,20 +582,68 @@ class BaseHandler(web.RequestHandler):
         if expiry > 0:
             self.set_header("Cache-Control", "max-age=%i" % expiry)
 
+        # set the ETag here so that it is cached along with the body,
+        # and cache hits don't need to hash the body again
+        self.set_header("Etag", body_etag(utf8(content)))
+        if self.check_etag_header():
+            self.set_status(304)
+        else:
+            self.write(content)
+        self.finish()
+
+        # The response has already been sent, so the client doesn't wait on the
+        # cache. It is still awaited so that concurrent requests for this page,
+        # held by `cached` until this one is done, find the result in the cache.
+        await self.cache_response(content, expiry)
+
+    async def cache_error_and_finish(self, exc):
+        """finish a request with the error page for an HTTPError and cache it
+
+        Errors are cached for a short time only, so repeated requests for
+        a missing resource don't go upstream every time.
+        """
+        expiry = self.cache_expiry_error
+        self.clear()
+        self.set_status(exc.status_code, reason=exc.reason)
+        if expiry > 0:
+            self.set_header("Cache-Control", "max-age=%i" % expiry)
+        content = self.render_error_page(
+            exc.status_code, exc_info=(type(exc), exc, exc.__traceback__)
+        )
+        self.set_header("Content-Type", "text/html")
         self.write(content)
         self.finish()
 
+        await self.cache_response(content, expiry, status=exc.status_code)
+
+    async def cache_response(self, content, expiry, status=None):
+        """store the response for this request in the cache"""
         short_url = self.truncate(self.request.path)
-        cache_data = pickle.dumps(
-            {"headers": self.cache_headers, "body": content}, pickle.HIGHEST_PROTOCOL
-        )
+        expires = time.time() + expiry
+        # the expiry is kept to send the remaining max-age with cache hits
+        response = {"headers": self.cache_headers, "body": content, "expires": expires}
+        content_type = self._headers.get("Content-Type", "").split(";")[0]
+        if len(content) >= web.GZipContentEncoding.MIN_LENGTH and (
+            content_type.startswith("text/")
+            or content_type in web.GZipContentEncoding.CONTENT_TYPES
+        ):
+            # store it compressed, ready to be sent as-is to clients accepting gzip
+            loop = asyncio.get_event_loop()
+            response["body"] = await loop.run_in_executor(
+                None,
+                gzip.compress,
+                utf8(content),
+                web.GZipContentEncoding.GZIP_LEVEL,
+            )
+            response["gzip"] = True
+        if status is not None:
+            response["status"] = status
+        cache_data = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
         log = self.log.info if expiry > self.cache_expiry_min else self.log.debug
         log("Caching (expiry=%is) %s", expiry, short_url)
         try:
             with time_block("Cache set %s" % short_url, logger=self.log):
-                await self.cache.set(
-                    self.cache_key, cache_data, int(time.time() + expiry)
-                )
+                await self.cache.set(self.cache_key, cache_data, int(expires))
         except Exception:
             self.log.error("Cache set for %s failed", short_url, exc_info=True)
         else:
@@ -566,9 +693,24 @@ def cached(method):
 
         if cached is not None:
             self.log.info("Cache hit %s", short_url)
+            if "status" in cached:
+                self.set_status(cached["status"])
             for key, value in cached["headers"].items():
                 self.set_header(key, value)
-            self.write(cached["body"])
+            max_age = int(cached.get("expires", 0) - time.time())
+            if max_age > 0:
+                self.set_header("Cache-Control", "max-age=%i" % max_age)
+            if self.get_status() == 200 and self.check_etag_header():
+                self.set_status(304)
+            else:
+                body = cached["body"]
+                if cached.get("gzip"):
+                    if self.accepts_gzip:
+                        # tornado's gzip transform leaves encoded bodies alone
+                        self.set_header("Content-Encoding", "gzip")
+                    else:
+                        body = gzip.decompress(body)
+                self.write(body)
         else:
             self.log.debug("Cache miss %s", short_url)
             await self.rate_limiter.check(self)
@@ -576,6 +718,11 @@ def cached(method):
             try:
                 # call the wrapped method
                 await method(self, *args, **kwargs)
+            except web.HTTPError as e:
+                if e.status_code not in self.cache_error_codes or self._finished:
+                    raise
+                self.log.warning("%i %s: %s", e.status_code, short_url, e)
+                await self.cache_error_and_finish(e)
             finally:
                 self.pending.pop(uri, None)
                 # notify waiters
@@ -623,11 +770,14 @@ class RenderingHandler(BaseHandler):
         """Generate a list of formats that can render the given nb json
 
         formats that do not provide a `test` method are assumed to work for
-        any notebook
+        any notebook, those that do are passed the notebook and its JSON as str
         """
         for name, format in self.formats.items():
             test = format.get("test", None)
             try:
+                if test is not None and isinstance(raw, bytes):
+                    # only decode the notebook if there is a test to pass it to
+                    raw = raw.decode("utf8")
                 if test is None or test(nb, raw):
                     yield (name, format)
             except Exception:
@@ -687,8 +837,8 @@ class RenderingHandler(BaseHandler):
 
         Parameters
         ----------
-        json_notebook: str
-            Notebook document in JSON format
+        json_notebook: bytes or str
+            Notebook document in JSON format, bytes are parsed as UTF-8
         download_url: str
             URL to download the notebook document
         msg: str, optional
@@ -718,11 +868,17 @@ class RenderingHandler(BaseHandler):
                     "Rendering %d B notebook from %s", len(json_notebook), download_url
                 )
                 render_time = self.statsd.timer("rendering.nbrender.time").start()
+                # format tests only run here, and needn't be sent to the pool
+                format = {
+                    key: value
+                    for key, value in self.formats[self.format].items()
+                    if key != "test"
+                }
                 loop = asyncio.get_event_loop()
                 nbhtml, config = await loop.run_in_executor(
                     self.pool,
                     render_notebook,
-                    self.formats[self.format],
+                    format,
                     nb,
                     download_url,
                     self.config,
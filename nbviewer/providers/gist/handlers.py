@@ -1,20 +1,24 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
-import json
 import os
+from collections import namedtuple
 
 from tornado import web
 
 from .. import _load_handler_from_location
 from ...utils import clean_filename
 from ...utils import quote
-from ...utils import response_text
+from ...utils import response_json
 from ...utils import url_path_join
 from ..base import BaseHandler
 from ..base import cached
+from ..base import ListingEntry
 from ..base import RenderingHandler
 from ..github.handlers import GithubClientMixin
 
+# an entry of a user's gist listing
+UserGistEntry = namedtuple("UserGistEntry", ["id", "notebooks", "description"])
+
 
 class GistClientMixin(GithubClientMixin):
 
@@ -84,17 +88,13 @@ class UserGistsHandler(GistClientMixin, BaseHandler):
 
         prev_url, next_url = self.get_page_links(response)
 
-        gists = json.loads(response_text(response))
+        gists = response_json(response)
         entries = []
         for gist in gists:
             notebooks = [f for f in gist["files"] if f.endswith(".ipynb")]
             if notebooks:
                 entries.append(
-                    dict(
-                        id=gist["id"],
-                        notebooks=notebooks,
-                        description=gist["description"] or "",
-                    )
+                    UserGistEntry(gist["id"], notebooks, gist["description"] or "")
                 )
         if self.github_url == "https://github.com/":
             gist_base_url = "https://gist.github.com/"
@@ -120,7 +120,7 @@ class GistHandler(GistClientMixin, RenderingHandler):
         with self.catch_client_error():
             response = await self.github_client.get_gist(gist_id)
 
-        gist = json.loads(response_text(response))
+        gist = response_json(response)
 
         gist_id = gist["id"]
 
@@ -156,12 +156,10 @@ class GistHandler(GistClientMixin, RenderingHandler):
         others = []
 
         for file in files.values():
-            e = {}
-            e["name"] = file["filename"]
-            if file["filename"].endswith(".ipynb"):
-                e["url"] = quote("/{}/{}".format(gist_id, file["filename"]))
-                e["class"] = "fa-book"
-                ipynbs.append(e)
+            name = file["filename"]
+            if name.endswith(".ipynb"):
+                url = quote("/{}/{}".format(gist_id, name))
+                ipynbs.append(ListingEntry(name, url, "fa-book"))
             else:
                 if self.github_url == "https://github.com/":
                     gist_base_url = "https://gist.github.com/"
@@ -172,12 +170,10 @@ class GistHandler(GistClientMixin, RenderingHandler):
                     "{user}/{gist_id}#file-{clean_name}".format(
                         user=user,
                         gist_id=gist_id,
-                        clean_name=clean_filename(file["filename"]),
+                        clean_name=clean_filename(name),
                     ),
                 )
-                e["url"] = provider_url
-                e["class"] = "fa-share"
-                others.append(e)
+                others.append(ListingEntry(name, provider_url, "fa-share"))
 
         entries.extend(ipynbs)
         entries.extend(others)
@@ -239,7 +235,7 @@ class GistHandler(GistClientMixin, RenderingHandler):
                 "Gist %s/%s truncated, fetching %s", gist_id, filename, file["raw_url"]
             )
             response = await self.fetch(file["raw_url"])
-            content = response_text(response, encoding="utf-8")
+            content = response.body
         else:
             content = file["content"]
 
@@ -12,6 +12,7 @@ from tornado.httpclient import HTTPError
 from tornado.httputil import url_concat
 
 from ...utils import quote
+from ...utils import response_json
 from ...utils import response_text
 from ...utils import url_path_join
 
@@ -172,8 +173,7 @@ class AsyncGitHubClient:
         """
         tree_response.rethrow()
         self.log.debug(tree_response)
-        jsondata = response_text(tree_response)
-        data = json.loads(jsondata)
+        data = response_json(tree_response)
         for entry in data["tree"]:
             if entry["path"] == path:
                 return entry
@@ -4,26 +4,33 @@
 #  Distributed under the terms of the BSD License.  The full license is in
 #  the file COPYING, distributed as part of this software.
 # -----------------------------------------------------------------------------
-import json
 import mimetypes
 import os
 import re
 
-from tornado import web
+from tornado import iostream
 from tornado.escape import url_unescape
+from tornado.ioloop import IOLoop
 
 from .. import _load_handler_from_location
 from ...utils import base64_decode
+from ...utils import base64_decode_chunks
+from ...utils import json_loads
 from ...utils import quote
-from ...utils import response_text
+from ...utils import response_json
 from ...utils import url_path_join
 from ..base import AddSlashHandler
 from ..base import BaseHandler
 from ..base import cached
+from ..base import ListingEntry
 from ..base import RemoveSlashHandler
 from ..base import RenderingHandler
 from .client import AsyncGitHubClient
 
+# non-notebook blobs with at least this much base64 (~12MB of data)
+# are sent as they are decoded, without caching the page
+STREAM_MIN_SIZE = 16 * 1024 * 1024
+
 
 class GithubClientMixin:
 
@@ -123,11 +130,11 @@ class GitHubUserHandler(GithubClientMixin, BaseHandler):
             response = await self.github_client.get_repos(user, params=params)
 
         prev_url, next_url = self.get_page_links(response)
-        repos = json.loads(response_text(response))
+        repos = response_json(response)
 
         entries = []
         for repo in repos:
-            entries.append(dict(url=repo["name"], name=repo["name"]))
+            entries.append(ListingEntry(repo["name"], repo["name"]))
 
         provider_url = "{github_url}{user}".format(
             user=user, github_url=self.github_url
@@ -145,8 +152,9 @@ class GitHubRepoHandler(GithubClientMixin, BaseHandler):
     """redirect /github/user/repo to .../tree/master"""
 
     async def get(self, user, repo):
-        response = await self.github_client.get_repo(user, repo)
-        default_branch = json.loads(response_text(response))["default_branch"]
+        with self.catch_client_error():
+            response = await self.github_client.get_repo(user, repo)
+        default_branch = response_json(response)["default_branch"]
 
         new_url = self.from_base(
             "/", self.format_prefix, "github", user, repo, "tree", default_branch
@@ -198,7 +206,7 @@ class GitHubTreeHandler(GithubClientMixin, BaseHandler):
             **namespace,
         )
 
-    async def _internal_get(self, user: str, repo: str, ref: str, path: str) -> str:
+    async def _internal_get(self, user: str, repo: str, ref: str, path: str) -> bytes:
         """
         Hook into here later during testing – probably via a CLI.
         Do avoid doing actual github requests.
@@ -207,8 +215,7 @@ class GitHubTreeHandler(GithubClientMixin, BaseHandler):
         """
         with self.catch_client_error():
             response = await self.github_client.get_contents(user, repo, path, ref=ref)
-            rt = response_text(response)
-        return rt
+        return response.body
 
     @cached
     async def get(self, user: str, repo: str, ref: str, path: str):
@@ -223,14 +230,14 @@ class GitHubTreeHandler(GithubClientMixin, BaseHandler):
 
         # TODO: check that we can't just use '.json()', it seem to me that recent
         # requests and similar expose a .json().
-        contents = json.loads(await self._internal_get(user, repo, ref, path))
+        contents = json_loads(await self._internal_get(user, repo, ref, path))
 
         branches, tags = await self.refs(user, repo)
 
+        nav_prefix = "/github/{user}/{repo}/tree/".format(user=user, repo=repo)
+        nav_suffix = "/" + path
         for nav_ref in branches + tags:
-            nav_ref["url"] = "/github/{user}/{repo}/tree/{ref}/{path}".format(
-                ref=nav_ref["name"], user=user, repo=repo, path=path
-            )
+            nav_ref["url"] = nav_prefix + nav_ref["name"] + nav_suffix
 
         if not isinstance(contents, list):
             self.log.info(
@@ -272,40 +279,30 @@ class GitHubTreeHandler(GithubClientMixin, BaseHandler):
         breadcrumbs = [{"url": base_url, "name": repo}]
         breadcrumbs.extend(self.breadcrumbs(path, base_url))
 
-        entries = []
+        # precompute the url prefixes shared by every entry
+        tree_prefix = base_url + "/"
+        blob_prefix = "/github/{user}/{repo}/blob/{ref}/".format(
+            user=user, repo=repo, ref=ref
+        )
+
         dirs = []
         ipynbs = []
         others = []
         for file in contents:
-            e = {}
-            e["name"] = file["name"]
+            name = file["name"]
             if file["type"] == "dir":
-                e["url"] = "/github/{user}/{repo}/tree/{ref}/{path}".format(
-                    user=user, repo=repo, ref=ref, path=file["path"]
-                )
-                e["url"] = quote(e["url"])
-                e["class"] = "fa-folder-open"
-                dirs.append(e)
-            elif file["name"].endswith(".ipynb"):
-                e["url"] = "/github/{user}/{repo}/blob/{ref}/{path}".format(
-                    user=user, repo=repo, ref=ref, path=file["path"]
-                )
-                e["url"] = quote(e["url"])
-                e["class"] = "fa-book"
-                ipynbs.append(e)
+                url = quote(tree_prefix + file["path"])
+                dirs.append(ListingEntry(name, url, "fa-folder-open"))
+            elif name.endswith(".ipynb"):
+                url = quote(blob_prefix + file["path"])
+                ipynbs.append(ListingEntry(name, url, "fa-book"))
             elif file["html_url"]:
-                e["url"] = file["html_url"]
-                e["class"] = "fa-share"
-                others.append(e)
+                others.append(ListingEntry(name, file["html_url"], "fa-share"))
             else:
                 # submodules don't have html_url
-                e["url"] = ""
-                e["class"] = "fa-folder-close"
-                others.append(e)
+                others.append(ListingEntry(name, "", "fa-folder-close"))
 
-        entries.extend(dirs)
-        entries.extend(ipynbs)
-        entries.extend(others)
+        entries = dirs + ipynbs + others
 
         # Enable a binder navbar icon if a binder base URL is configured
         executor_url = (
@@ -340,7 +337,7 @@ class GitHubTreeHandler(GithubClientMixin, BaseHandler):
                 response = await getattr(self.github_client, "get_%s" % ref_type)(
                     user, repo
                 )
-            ref_data[i] = json.loads(response_text(response))
+            ref_data[i] = response_json(response)
 
         return ref_data
 
@@ -396,9 +393,34 @@ class GitHubBlobHandler(GithubClientMixin, RenderingHandler):
         with self.catch_client_error():
             response = await self.github_client.fetch(tree_entry["url"])
 
-        data = json.loads(response_text(response))
+        data = response_json(response)
         contents = data["content"]
-        if data["encoding"] == "base64":
+        is_base64 = data["encoding"] == "base64"
+        if (
+            is_base64
+            and len(contents) >= STREAM_MIN_SIZE
+            and not path.endswith(".ipynb")
+        ):
+            # not worth caching, decode it while it is sent
+            if self._finished:
+                # the 'waiting' page was sent while the blob was fetched
+                return
+            if self.render_timeout:
+                # nothing to render, and once the headers are flushed
+                # the 'waiting' page must not be written into the file
+                IOLoop.current().remove_timeout(self.slow_timeout)
+            mime, enc = mimetypes.guess_type(path)
+            self.set_header("Content-Type", mime or "text/plain")
+            for chunk in base64_decode_chunks(contents):
+                try:
+                    self.write(chunk)
+                    await self.flush()
+                except iostream.StreamClosedError:
+                    return
+            self.finish()
+            return
+
+        if is_base64:
             # filedata will be bytes
             filedata = base64_decode(contents)
         else:
@@ -426,16 +448,6 @@ class GitHubBlobHandler(GithubClientMixin, RenderingHandler):
                 else None
             )
 
-            try:
-                # filedata may be bytes, but we need text
-                if isinstance(filedata, bytes):
-                    nbjson = filedata.decode("utf-8")
-                else:
-                    nbjson = filedata
-            except Exception:
-                self.log.error("Failed to decode notebook: %s", raw_url, exc_info=True)
-                raise web.HTTPError(400)
-
             # Explanation of some kwargs passed into `finish_notebook`:
             # provider_url:
             #     URL to the notebook document upstream at the provider (e.g., GitHub)
@@ -444,7 +456,7 @@ class GitHubBlobHandler(GithubClientMixin, RenderingHandler):
             # executor_url: str, optional
             #     URL to execute the notebook document (e.g., Binder)
             await self.finish_notebook(
-                nbjson,
+                filedata,
                 raw_url,
                 provider_url=blob_url,
                 executor_url=executor_url,
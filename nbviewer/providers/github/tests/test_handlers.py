@@ -1,7 +1,19 @@
 # encoding: utf-8
+import asyncio
+import io
+import json
 import os
+import sys
+from unittest import mock
 from unittest import TestCase
 
+from tornado.httpclient import HTTPRequest
+from tornado.httpclient import HTTPResponse
+from tornado.testing import AsyncHTTPTestCase
+
+from .. import handlers
+from ....app import NBViewer
+from ....utils import base64_encode
 from ....utils import transform_ipynb_uri
 from ..handlers import uri_rewrites
 
@@ -69,3 +81,80 @@ class TestRewrite(TestCase):
         uri = "https://example.com/user/reopname/tree/deadbeef/a mřížka.ipynb"
         rewrite = "/github/user/reopname/tree/deadbeef/a mřížka.ipynb"
         self.assert_rewrite_ghe(uri, rewrite)
+
+
+class FakeGitHubClient:
+    """Serves canned GitHub API responses, by url"""
+
+    # seconds each response takes
+    delay = 0
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def fetch(self, url, **kwargs):
+        request = HTTPRequest(url)
+        body = json.dumps(self.responses[url.split("?")[0]]).encode("utf8")
+        response = HTTPResponse(request, 200, buffer=io.BytesIO(body))
+        future = asyncio.Future()
+        if self.delay:
+            asyncio.get_event_loop().call_later(self.delay, future.set_result, response)
+        else:
+            future.set_result(response)
+        return future
+
+
+class GitHubBlobStreamTestCase(AsyncHTTPTestCase):
+    """Large non-notebook blobs are decoded while they are sent"""
+
+    api_url = "https://api.github.com/repos/user/repo/git/"
+    data = bytes(range(256)) * 1024
+
+    def get_app(self):
+        argv = ["nbviewer", "--render-timeout=1", "--processes=0", "--no-cache"]
+        with mock.patch.object(sys, "argv", argv):
+            app = NBViewer().tornado_application
+        tree_url = self.api_url + "trees/main"
+        blob_url = self.api_url + "blobs/abc"
+        tree = [{"path": "data.bin", "type": "blob", "url": blob_url}]
+        blob = {"encoding": "base64", "content": base64_encode(self.data)}
+        app.settings["client"] = FakeGitHubClient(
+            {tree_url: {"tree": tree}, blob_url: blob}
+        )
+        return app
+
+    def test_stream_past_render_timeout(self):
+        flush = handlers.GitHubBlobHandler.flush
+
+        def slow_flush(handler, include_footers=False):
+            if include_footers:
+                # finish() flushes the rest right away
+                return flush(handler, include_footers)
+
+            async def delayed():
+                # a slow client, outlasting render_timeout while the file is sent
+                await asyncio.sleep(0.4)
+                await flush(handler)
+
+            return asyncio.ensure_future(delayed())
+
+        with mock.patch.object(handlers, "STREAM_MIN_SIZE", 1024), mock.patch.object(
+            handlers.GitHubBlobHandler, "flush", slow_flush
+        ):
+            response = self.fetch("/github/user/repo/blob/main/data.bin")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, self.data)
+
+    def test_slow_upstream(self):
+        # the 'waiting' page is sent while the blob is fetched
+        client = self._app.settings["client"]
+        decode = mock.Mock(wraps=handlers.base64_decode_chunks)
+        with mock.patch.object(handlers, "STREAM_MIN_SIZE", 1024), mock.patch.object(
+            handlers, "base64_decode_chunks", decode
+        ), mock.patch.object(client, "delay", 0.6):
+            response = self.fetch("/github/user/repo/blob/main/data.bin")
+            self.assertEqual(response.code, 202)
+            # let the handler get the blob
+            self.io_loop.run_sync(lambda: asyncio.sleep(0.5))
+        # and not decode what can't be sent anymore
+        decode.assert_not_called()
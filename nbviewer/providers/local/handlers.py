@@ -26,6 +26,8 @@ class LocalFileHandler(RenderingHandler):
 
     # cache key is full uri to avoid mixing download vs view paths
     _cache_key_attr = "uri"
+    # local files can appear at any time, don't cache missing ones
+    cache_error_codes = ()
     # provider root path
     _localfile_path = "/localfile"
 
@@ -149,7 +151,7 @@ class LocalFileHandler(RenderingHandler):
 
     async def deliver_notebook(self, fullpath, path):
         try:
-            with open(fullpath, encoding="utf-8") as f:
+            with open(fullpath, "rb") as f:
                 nbdata = f.read()
         except OSError as ex:
             if ex.errno == errno.EACCES:
@@ -8,7 +8,6 @@ from urllib import robotparser
 from urllib.parse import urlparse
 
 from tornado import httpclient
-from tornado import web
 from tornado.escape import url_unescape
 
 from .. import _load_handler_from_location
@@ -69,14 +68,9 @@ class URLHandler(RenderingHandler):
     async def deliver_notebook(self, remote_url, public):
         response = await self.fetch(remote_url)
 
-        try:
-            nbjson = response_text(response, encoding="utf-8")
-        except UnicodeDecodeError:
-            self.log.error("Notebook is not utf8: %s", remote_url, exc_info=True)
-            raise web.HTTPError(400)
-
+        # the notebook is parsed straight from the UTF-8 body
         await self.finish_notebook(
-            nbjson,
+            response.body,
             download_url=remote_url,
             msg="file from url: %s" % remote_url,
             public=public,
@@ -0,0 +1,77 @@
+# -----------------------------------------------------------------------------
+#  Copyright (C) Jupyter Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# -----------------------------------------------------------------------------
+import os
+import shutil
+import uuid
+
+import requests
+
+from .base import NBViewerTestCase
+
+here = os.path.dirname(__file__)
+
+
+class PageCacheTestCase(NBViewerTestCase):
+    @classmethod
+    def get_server_cmd(cls):
+        return super().get_server_cmd() + ["--localfiles=."]
+
+    def test_etag_cache_hit(self):
+        ## assumes being run from base of this repo
+        url = self.url("localfile/nbviewer/tests/notebook.ipynb")
+        r = requests.get(url)
+        self.assertEqual(r.status_code, 200)
+        etag = r.headers["Etag"]
+        max_age = int(r.headers["Cache-Control"].split("=")[1])
+
+        # served from the cache, fresh for no longer than the first response
+        r = requests.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.content, b"")
+        self.assertLessEqual(int(r.headers["Cache-Control"].split("=")[1]), max_age)
+        r = requests.get(url, headers={"If-None-Match": '"other"'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers["Etag"], etag)
+        self.assertLessEqual(int(r.headers["Cache-Control"].split("=")[1]), max_age)
+
+    def test_gzip_cache_hit(self):
+        url = self.url("localfile/nbviewer/tests/notebook.ipynb?gzip")
+        first = requests.get(url)
+        self.assertEqual(first.status_code, 200)
+
+        # served from the cache
+        gzipped = requests.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(gzipped.status_code, 200)
+        self.assertEqual(gzipped.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", gzipped.headers["Vary"])
+        plain = requests.get(url, headers={"Accept-Encoding": "identity"})
+        self.assertEqual(plain.status_code, 200)
+        self.assertIsNone(plain.headers.get("Content-Encoding"))
+        self.assertEqual(gzipped.content, first.content)
+        self.assertEqual(plain.content, first.content)
+
+    def test_cached_404(self):
+        # LocalFileHandler doesn't cache errors, so fetch the local file
+        # through the url provider, which does
+        name = "cache-test-%s.ipynb" % uuid.uuid4().hex
+        path = os.path.join(here, name)
+        url = self.url(
+            "url/localhost:%i/localfile/nbviewer/tests/%s" % (self.port, name)
+        )
+        r = requests.get(url)
+        self.assertEqual(r.status_code, 404)
+        self.assertIn("max-age", r.headers["Cache-Control"])
+
+        shutil.copy(os.path.join(here, "notebook.ipynb"), path)
+        try:
+            # the 404 is replayed from the cache, with its status
+            r = requests.get(url)
+            self.assertEqual(r.status_code, 404)
+            self.assertIn("max-age", r.headers["Cache-Control"])
+            self.assertIn("Remote HTTP 404", r.text)
+        finally:
+            os.remove(path)
@@ -0,0 +1,85 @@
+import asyncio
+import io
+import unittest.mock as mock
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPError
+from tornado.httpclient import HTTPResponse
+from tornado.httputil import HTTPHeaders
+from tornado.log import app_log
+from tornado.testing import AsyncTestCase
+from tornado.testing import gen_test
+
+from ..cache import DummyAsyncCache
+from ..client import NBViewerAsyncHTTPClient
+
+
+class NBViewerClientTest(AsyncTestCase):
+    """Tests that the caching client revalidates and shares upstream requests."""
+
+    url = "https://example.com/notebook.ipynb"
+
+    def setUp(self):
+        super().setUp()
+        self.http_client = mock.create_autospec(AsyncHTTPClient)
+        self.client = NBViewerAsyncHTTPClient(log=app_log, client=self.http_client)
+        self.client.cache = DummyAsyncCache()
+
+    def _response(self, request, code=200, body=b"", headers=None):
+        return HTTPResponse(
+            request, code, headers=HTTPHeaders(headers or {}), buffer=io.BytesIO(body)
+        )
+
+    @gen_test
+    async def test_revalidate_not_modified(self):
+        async def fetch(request):
+            if request.headers.get("If-None-Match") == '"abc"':
+                response = self._response(
+                    request, 304, headers={"X-RateLimit-Remaining": "41"}
+                )
+                raise HTTPError(304, response=response)
+            return self._response(
+                request,
+                body=b"{}",
+                headers={"ETag": '"abc"', "X-RateLimit-Remaining": "42"},
+            )
+
+        self.http_client.fetch.side_effect = fetch
+        first = await self.client.fetch(self.url)
+        second = await self.client.fetch(self.url)
+        self.assertEqual(self.http_client.fetch.call_count, 2)
+        request = self.http_client.fetch.call_args[0][0]
+        self.assertEqual(request.headers["If-None-Match"], '"abc"')
+        self.assertEqual(second.body, first.body)
+        # the rate limit is the one reported with the 304
+        self.assertEqual(second.headers["X-RateLimit-Remaining"], "41")
+
+    @gen_test
+    async def test_share_inflight(self):
+        async def fetch(request):
+            return self._response(request, body=b"{}")
+
+        self.http_client.fetch.side_effect = fetch
+        futures = [self.client.fetch(self.url) for i in range(3)]
+        for future in futures:
+            response = await future
+            self.assertEqual(response.body, b"{}")
+        self.assertEqual(self.http_client.fetch.call_count, 1)
+        self.assertEqual(self.client.pending, {})
+
+    @gen_test
+    async def test_cancel_shared(self):
+        release = asyncio.Event()
+
+        async def fetch(request):
+            await release.wait()
+            return self._response(request, body=b"{}")
+
+        self.http_client.fetch.side_effect = fetch
+        first = self.client.fetch(self.url)
+        second = self.client.fetch(self.url)
+        first.cancel()
+        release.set()
+        response = await second
+        self.assertEqual(response.body, b"{}")
+        self.assertEqual(self.http_client.fetch.call_count, 1)
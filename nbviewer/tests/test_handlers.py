@@ -0,0 +1,83 @@
+# -----------------------------------------------------------------------------
+#  Copyright (C) Jupyter Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# -----------------------------------------------------------------------------
+from tornado import web
+from tornado.httputil import HTTPServerRequest
+
+from nbviewer.handlers import group_handlers
+
+
+class A(web.RequestHandler):
+    pass
+
+
+class B(web.RequestHandler):
+    pass
+
+
+class C(web.RequestHandler):
+    pass
+
+
+def assert_same_routes(handlers, paths):
+    """Grouped handlers route each path to the same handler as the flat list"""
+    flat = web.Application(handlers).wildcard_router
+    grouped = web.Application(group_handlers(handlers)).wildcard_router
+    for path in paths:
+        request = HTTPServerRequest(uri=path)
+        expected = flat.find_handler(request)
+        found = grouped.find_handler(request)
+        assert found.handler_class is expected.handler_class, path
+        assert found.path_args == expected.path_args, path
+        assert found.path_kwargs == expected.path_kwargs, path
+
+
+def test_group_handlers():
+    handlers = [
+        (r"/?", A, {}),
+        (r"/gist/([^\/]+/)?([0-9]+)", A, {}),
+        (r"/gist/([^\/]+/)?([0-9]+)/(.*)", B, {}),
+        (r"/url[s]?/github\.com/(.*)", B, {}),
+        (r"/url(?P<secure>[s]?)/(?P<url>.*)", A, {}),
+        (r"/([0-9]+)", B, {}),
+        (r"/gist/([^\/]+)/?", C, {}),
+        (r"/format/html/gist/([0-9]+)", C, {}),
+        (r"/format/html/url/(.*)", C, {}),
+        (r".*", C, {}),
+    ]
+    assert len(group_handlers(handlers)) < len(handlers)
+    assert_same_routes(
+        handlers,
+        [
+            "/",
+            "/gist/1234",
+            "/gist/user/1234",
+            "/gist/user/1234/x.ipynb",
+            "/gist/user",
+            "/urls/github.com/x",
+            "/url/example.com/x",
+            "/urls/example.com/x",
+            "/1234",
+            "/format/html/gist/1234",
+            "/format/html/url/x",
+            "/format/slides/url/x",
+            "/nope",
+        ],
+    )
+
+
+def test_group_handlers_alternation():
+    handlers = [
+        (r"/foo/x|/bar/y", A, {}),
+        (r"/foo/(.*)", B, {}),
+        (r"/bar/(.*)", B, {}),
+        (r"/(foo|bar)/z", C, {}),
+        (r"/foo/[|]", C, {}),
+        (r".*", C, {}),
+    ]
+    assert_same_routes(
+        handlers, ["/foo/x", "/bar/y", "/foo/z", "/bar/z", "/foo/|", "/baz"]
+    )
@@ -5,6 +5,10 @@
 #  Distributed under the terms of the BSD License.  The full license is in
 #  the file COPYING, distributed as part of this software.
 # -----------------------------------------------------------------------------
+import binascii
+
+import pytest
+
 from nbviewer import utils
 from nbviewer.providers import default_rewrites
 from nbviewer.providers import provider_uri_rewrites
@@ -100,3 +104,30 @@ def test_quote():
         quoted = utils.quote(s)
         assert quoted == expected
         assert type(quoted) == type(expected)
+
+
+def test_json_loads():
+    text = '{"name": "ü.ipynb", "cells": [1, 2]}'
+    expected = {"name": "ü.ipynb", "cells": [1, 2]}
+    assert utils.json_loads(text) == expected
+    assert utils.json_loads(text.encode("utf8")) == expected
+
+
+def test_base64_decode():
+    data = "ü notebook\n".encode("utf8") * 20
+    encoded = utils.base64_encode(data)
+    assert "\n" in encoded
+    assert utils.base64_decode(encoded) == data
+    assert utils.base64_decode(encoded.encode("ascii")) == data
+    with pytest.raises(binascii.Error):
+        utils.base64_decode(b"abc")
+
+
+def test_base64_decode_chunks():
+    data = bytes(range(256)) * 10
+    encoded = utils.base64_encode(data)
+    assert "\n" in encoded
+    for chunk_size in (3, 7, 100, 10000):
+        chunks = list(utils.base64_decode_chunks(encoded, chunk_size=chunk_size))
+        assert b"".join(chunks) == data
+    assert list(utils.base64_decode_chunks("")) == []
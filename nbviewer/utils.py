@@ -9,8 +9,8 @@ import json
 import os
 import re
 import time
-from base64 import decodebytes
 from base64 import encodebytes
+from binascii import a2b_base64
 from contextlib import contextmanager
 from subprocess import check_output
 from urllib.parse import parse_qs
@@ -19,6 +19,11 @@ from urllib.parse import urlencode
 from urllib.parse import urlparse
 from urllib.parse import urlunparse
 
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:
+    orjson = None  # type: ignore
+
 STRIP_PARAMS = ["client_id", "client_secret", "access_token"]
 
 HERE = os.path.dirname(__file__)
@@ -137,6 +142,28 @@ def response_text(response, encoding=None):
     return response.body.decode(encoding, "replace")
 
 
+def json_loads(s):
+    """Parse a JSON document from str or bytes
+
+    Uses orjson when available, which parses bytes directly
+    without an intermediate decode.
+    """
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def response_json(response):
+    """mimic requests.json(), but for plain HTTPResponse
+
+    JSON is always UTF-8 (RFC 8259), so the body bytes are
+    handed to the parser as-is when orjson is available.
+    """
+    if orjson is not None:
+        return orjson.loads(response.body)
+    return json.loads(response_text(response))
+
+
 # parse_header_links from requests.util
 # modified to actually return a dict, like the docstring says.
 
@@ -206,12 +233,35 @@ def jupyter_info():
 def base64_decode(s):
     """unicode-safe base64
 
-    base64 API only talks bytes
+    binascii accepts ASCII str as well as bytes, so the common case
+    is decoded in a single pass without an intermediate bytes copy.
+    Line breaks (as in GitHub's wrapped base64) are skipped.
     """
-    if not isinstance(s, bytes):
-        s = s.encode("ascii", "replace")
-    decoded = decodebytes(s)
-    return decoded
+    try:
+        return a2b_base64(s)
+    except ValueError:
+        if not isinstance(s, str):
+            # invalid base64 (binascii.Error is a ValueError)
+            raise
+        # non-ascii str
+        return a2b_base64(s.encode("ascii", "replace"))
+
+
+def base64_decode_chunks(s, chunk_size=64 * 1024):
+    """Decode base64 in chunks of about chunk_size bytes
+
+    For sending large files without holding all of the decoded data.
+    """
+    step = chunk_size * 4 // 3
+    start = 0
+    while start < len(s):
+        end = start + step
+        # line breaks are skipped by the decoder,
+        # so extend the piece to a whole number of 4-character groups
+        while end < len(s) and (end - start - s.count("\n", start, end)) % 4:
+            end += 1
+        yield base64_decode(s[start:end])
+        start = end
 
 
 def base64_encode(s):